@@ -3,10 +3,12 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 import math
 import plotly.express as px
 import plotly.graph_objects as go
-import pydeck as pdk
 import folium
 from streamlit_folium import st_folium
 
@@ -18,65 +20,168 @@ st.set_page_config(
 )
 PRIMARY_RED = "#CC0000"
 DARK_BG     = "#171A20"
+FILTER_CACHE_ENTRIES = 16  # filter states kept per cached function before LRU eviction
+# Compact dtypes for the merged frame: halves the bytes every filter/groupby touches
+COMPACT_DTYPES = {
+    **{c: "category" for c in ["charger_type","region","station_name"]},
+    **{c: "int16" for c in ["num_ports_sess","num_ports_stat","queue_length","idle_time","traffic_volume"]},
+    **{c: "float32" for c in ["wait_time","temperature_C","precip_mm","energy_kwh"]},
+}
 
 # ─── Load & merge enhanced data ───────────────────────────────────────────────
 @st.cache_data
-def load_data():
-    sess = pd.read_parquet("sessions_enhanced.parquet")
-    sess["start_time"] = pd.to_datetime(sess["start_time"])
-    stats = pd.read_parquet("stations_enhanced.parquet")
-    df = sess.merge(stats, on="station_id", suffixes=("_sess","_stat"))
-    df = df.drop(columns=["region_sess"]).rename(columns={"region_stat":"region"})
-    return df
-
-# Cache base Folium map for expansion analysis
-def make_base_map(stats):
-    m = folium.Map(location=[stats.lat.mean(), stats.lon.mean()], zoom_start=4)
-    for _, r in stats.iterrows():
-        folium.CircleMarker(
-            location=[r.lat, r.lon],
-            radius=4,
-            color="blue",
-            fill=True,
-            fill_opacity=0.7
-        ).add_to(m)
+def load_stations():
+    return pd.read_parquet("stations_enhanced.parquet")
+
+@st.cache_data
+def load_filter_options():
+    stats = load_stations()
+    start = pq.read_table("sessions_enhanced.parquet", columns=["start_time"])["start_time"]
+    bounds = pc.min_max(start)
+    return (
+        (bounds["min"].as_py().date(), bounds["max"].as_py().date()),
+        sorted(stats.charger_type.unique()),
+        sorted(stats.region.unique()),
+    )
+
+@st.cache_data(max_entries=FILTER_CACHE_ENTRIES)
+def load_data(min_date, max_date, chargers, regions):
+    # Filters are pushed into the Parquet scan so only matching rows are decoded
+    stats = pa.Table.from_pandas(load_stations(), preserve_index=False)
+    stats = stats.filter(pc.field("charger_type").isin(pa.array(chargers, pa.string())) &
+                         pc.field("region").isin(pa.array(regions, pa.string())))
+    sess = pq.read_table("sessions_enhanced.parquet", filters=[
+        ("station_id", "in", stats["station_id"].to_pylist()),
+        ("start_time", ">=", np.datetime64(min_date, "ns")),
+        ("start_time", "<", np.datetime64(max_date, "ns") + np.timedelta64(1, "D")),
+    ])
+    # Arrow hash join; only the pandas conversion at the end copies the rows
+    df = sess.join(stats, keys="station_id", join_type="inner", left_suffix="_sess", right_suffix="_stat")
+    df = df.drop_columns(["region_sess"]).rename_columns({"region_stat":"region"}).to_pandas()
+    return df.astype(COMPACT_DTYPES)
+
+# Group with Arrow's hash-aggregate kernels; `aggs` maps output name -> (column, function).
+# Use column None with "count_all" for group sizes without reading any column.
+def arrow_agg(df, keys, **aggs):
+    cols = keys + [c for c in dict.fromkeys(c for c, _ in aggs.values()) if c is not None and c not in keys]
+    table = pa.Table.from_pandas(df[cols], preserve_index=False)
+    out = table.group_by(keys).aggregate([([] if c is None else c, fn) for c, fn in aggs.values()])
+    out = out.rename_columns({fn if c is None else f"{c}_{fn}": name for name, (c, fn) in aggs.items()})
+    return out.to_pandas()[keys + list(aggs)]
+
+# ─── Cached aggregations (keyed on the filter state) ─────────────────────────
+@st.cache_data(show_spinner=False, max_entries=FILTER_CACHE_ENTRIES)
+def compute_util(*filters):
+    return arrow_agg(load_data(*filters), ["station_id","station_name","lat","lon"],
+                     sessions=(None,"count_all"), avg_wait=("wait_time","mean"))
+
+@st.cache_data(show_spinner=False, max_entries=FILTER_CACHE_ENTRIES)
+def compute_wait_ts(*filters):
+    ts = load_data(*filters).set_index("start_time").resample("D").agg({
+        "wait_time":"mean",
+        "session_id":"count",
+        "local_event":"max"
+    }).rename(columns={"session_id":"sessions","local_event":"event_occurred"}).reset_index()
+    ts["event_occurred"] = ts.event_occurred.fillna(False).astype(bool)
+    ts["roll7"] = ts.wait_time.rolling(7, center=True, min_periods=1).mean()
+    mu, sigma = ts.wait_time.agg(["mean","std"])
+    ts["anomaly"] = ts.wait_time.to_numpy() > (mu + 2*sigma)
+    return ts
+
+@st.cache_data(show_spinner=False, max_entries=FILTER_CACHE_ENTRIES)
+def compute_top10(*filters):
+    sizes = arrow_agg(load_data(*filters), ["station_name"], sessions=(None,"count_all"))
+    return sizes.nlargest(10, "sessions").reset_index(drop=True)
+
+@st.cache_data(show_spinner=False, max_entries=FILTER_CACHE_ENTRIES)
+def compute_revcost(*filters):
+    revcost = arrow_agg(load_data(*filters), ["station_name"], revenue=("revenue","sum"), cost=("cost","sum"))
+    return revcost.sort_values("station_name", ignore_index=True)
+
+# One groupby pass for both box plots; the 0.5 quantile doubles as the station ordering
+@st.cache_data(show_spinner=False, max_entries=FILTER_CACHE_ENTRIES)
+def compute_box_quantiles(*filters):
+    cols, qs = ["queue_length","idle_time"], [0.0, 0.25, 0.5, 0.75, 1.0]
+    q = load_data(*filters).groupby("station_name", observed=True)[cols].quantile(qs).unstack()
+    # An empty selection unstacks to no columns; keep the (column, quantile) layout regardless
+    return q.reindex(columns=pd.MultiIndex.from_product([cols, qs]))
+
+# CSV payloads for the download buttons, serialized once per filter state
+@st.cache_data(show_spinner=False, max_entries=FILTER_CACHE_ENTRIES)
+def wait_times_csv(*filters):
+    return compute_wait_ts(*filters).to_csv(index=False).encode()
+
+@st.cache_data(show_spinner=False, max_entries=FILTER_CACHE_ENTRIES)
+def top10_csv(*filters):
+    return compute_top10(*filters).to_csv(index=False).encode()
+
+@st.cache_data(show_spinner=False, max_entries=FILTER_CACHE_ENTRIES)
+def revcost_csv(*filters):
+    return compute_revcost(*filters).to_csv(index=False).encode()
+
+@st.cache_data(show_spinner=False, max_entries=FILTER_CACHE_ENTRIES)
+def queue_capacity_csv(*filters):
+    return load_data(*filters)[["station_name","queue_length","idle_time"]].to_csv(index=False).encode()
+
+# Horizontal box plot drawn from per-station quantiles, so only the summaries reach the browser
+def summary_box(q, col, order, highlight, colors):
+    traces = []
+    for top in (True, False):
+        stations = [s for s in order if (s in highlight) == top]
+        qs = q.loc[stations, col]
+        traces.append(go.Box(
+            y=stations, orientation="h", name="Top 10" if top else "Other",
+            lowerfence=qs[0.0].to_numpy(), q1=qs[0.25].to_numpy(), median=qs[0.5].to_numpy(),
+            q3=qs[0.75].to_numpy(), upperfence=qs[1.0].to_numpy(),
+            marker_color=colors[top]
+        ))
+    fig = go.Figure(traces)
+    fig.update_layout(boxmode="overlay", yaxis=dict(categoryorder="array", categoryarray=order[::-1]))
+    return fig
+
+# Cache base Folium map for expansion analysis; `coords` is a hashable tuple of (lat, lon)
+def make_base_map(coords):
+    lats, lons = np.array(coords).T
+    m = folium.Map(location=[lats.mean(), lons.mean()], zoom_start=4)
+    features = [
+        {"type": "Feature", "geometry": {"type": "Point", "coordinates": [lon, lat]}, "properties": {}}
+        for lat, lon in coords
+    ]
+    folium.GeoJson(
+        {"type": "FeatureCollection", "features": features},
+        marker=folium.CircleMarker(radius=4, color="blue", fill=True, fill_opacity=0.7)
+    ).add_to(m)
     return m
 # Cache decorator to avoid re-creation
 get_base_map = st.cache_data(make_base_map)
 
-# Load data
-df = load_data()
-
 # ─── Sidebar Filters ──────────────────────────────────────────────────────────
+date_bounds, charger_opts, region_opts = load_filter_options()
 st.sidebar.header("Filters")
 min_date, max_date = st.sidebar.date_input(
     "Date range",
-    value=(df.start_time.min().date(), df.start_time.max().date())
+    value=date_bounds
 )
 charger_sel = st.sidebar.multiselect(
     "Charger Type",
-    options=sorted(df.charger_type.unique()),
-    default=sorted(df.charger_type.unique())
+    options=charger_opts,
+    default=charger_opts
 )
 region_sel = st.sidebar.multiselect(
     "Region",
-    options=sorted(df.region.unique()),
-    default=sorted(df.region.unique())
+    options=region_opts,
+    default=region_opts
 )
-# Apply filters
-df = df.loc[
-    (df.start_time.dt.date >= min_date) &
-    (df.start_time.dt.date <= max_date) &
-    df.charger_type.isin(charger_sel) &
-    df.region.isin(region_sel)
-]
+# Load only the filtered rows; the tuple also keys every cached aggregation
+filters = (min_date, max_date, tuple(charger_sel), tuple(region_sel))
+df = load_data(*filters)
 
 # ─── KPI Cards ────────────────────────────────────────────────────────────────
 st.markdown("## 🔌 Tesla Supercharger Network Dashboard")
 c1, c2, c3, c4 = st.columns(4)
-c1.metric("Total Sessions", f"{df.session_id.nunique():,}")
+c1.metric("Total Sessions", f"{len(df):,}")
 c2.metric("Avg. Wait (min)", f"{df.wait_time.mean():.1f}")
-c3.metric("Total Revenue", f"${df.revenue.sum():,}")
+c3.metric("Total Revenue", f"${df.revenue.sum():,.2f}")
 c4.metric("Avg. NPS", f"{df.satisfaction_nps.mean():.1f}")
 
 # ─── Tabs Setup ───────────────────────────────────────────────────────────────
@@ -101,11 +206,7 @@ with tabs[0]:
 with tabs[1]:
     st.header("Network Utilization Map")
     style = st.selectbox("Map Style", ["Plotly Scatter Map", "Density Map"])
-    util = (
-        df.groupby(["station_id","station_name","lat","lon"])  \
-          .agg(sessions=("session_id","count"), avg_wait=("wait_time","mean"))  \
-          .reset_index()
-    )
+    util = compute_util(*filters)
     if style == "Plotly Scatter Map":
         util["size"]  = util.sessions / util.sessions.max() * 50
         util["color"] = (util.avg_wait - util.avg_wait.min()) / (util.avg_wait.max() - util.avg_wait.min())
@@ -137,15 +238,7 @@ with tabs[1]:
 # ─── Tab 2: Wait Times ─────────────────────────────────────────────────────────
 with tabs[2]:
     st.header("Average Wait Time Over Time")
-    ts = df.set_index("start_time").resample("D").agg({
-        "wait_time":"mean",
-        "session_id":"count",
-        "local_event":"max"
-    }).rename(columns={"session_id":"sessions","local_event":"event_occurred"}).reset_index()
-    ts["event_occurred"] = ts.event_occurred.fillna(False).astype(bool)
-    ts["roll7"] = ts.wait_time.rolling(7, center=True).mean()
-    mu, sigma = ts.wait_time.mean(), ts.wait_time.std()
-    ts["anomaly"] = ts.wait_time > (mu + 2*sigma)
+    ts = compute_wait_ts(*filters)
     fig = go.Figure()
     fig.add_trace(go.Scatter(x=ts.start_time, y=ts.wait_time, mode="lines",
                               line=dict(color="rgba(204,0,0,0.2)"), name="Daily Avg Wait"))
@@ -153,63 +246,56 @@ with tabs[2]:
                               line=dict(color=PRIMARY_RED, width=3), name="7D Rolling Avg"))
     fig.add_trace(go.Scatter(x=ts.loc[ts.anomaly, "start_time"], y=ts.loc[ts.anomaly, "wait_time"],
                               mode="markers", marker=dict(color="black", size=6), name="Anomaly (>2σ)"))
-    for d in ts.loc[ts.event_occurred, "start_time"]:
-        fig.add_vline(x=d, line_dash="dot", line_color="gray", opacity=0.3)
+    event_lines = [
+        dict(type="line", xref="x", yref="paper", x0=d, x1=d, y0=0, y1=1,
+             line=dict(dash="dot", color="gray"), opacity=0.3)
+        for d in ts.loc[ts.event_occurred, "start_time"]
+    ]
     fig.update_layout(title="Daily Avg Wait with Rolling Avg, Anomalies & Events",
+                      shapes=event_lines,
                       xaxis_title="Date", yaxis_title="Wait (mins)",
                       xaxis=dict(rangeslider=dict(visible=True)),
                       legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
     st.plotly_chart(fig, use_container_width=True)
     with st.expander("Download CSV"):
-        st.download_button("Download", ts.to_csv(index=False), "wait_times.csv", "text/csv")
+        st.download_button("Download", wait_times_csv(*filters), "wait_times.csv", "text/csv")
 
 # ─── Tab 3: Busiest Stations ───────────────────────────────────────────────────
 with tabs[3]:
     st.header("Top 10 Busiest Stations")
-    top10 = df.station_name.value_counts().nlargest(10)
-    top10 = top10.rename_axis("station_name").reset_index(name="sessions")
+    top10 = compute_top10(*filters)
     fig = px.bar(top10, x="sessions", y="station_name", orientation="h",
                  color_discrete_sequence=[PRIMARY_RED], labels={"sessions":"Sessions","station_name":"Station"},
                  title="Sessions by Station")
     st.plotly_chart(fig, use_container_width=True)
     with st.expander("Download CSV"):
-        st.download_button("Download", top10.to_csv(index=False), "top10_stations.csv", "text/csv")
+        st.download_button("Download", top10_csv(*filters), "top10_stations.csv", "text/csv")
 
 # ─── Tab 4: Revenue vs Cost ────────────────────────────────────────────────────
 with tabs[4]:
     st.header("Revenue vs. Cost per Station")
-    revcost = df.groupby("station_name").agg({"revenue":"sum","cost":"sum"}).reset_index()
+    revcost = compute_revcost(*filters)
     fig = px.bar(revcost, x="station_name", y=["revenue","cost"], barmode="group",
                  color_discrete_map={"revenue":PRIMARY_RED, "cost":DARK_BG},
                  labels={"value":"USD","station_name":"Station","variable":"Metric"},
                  title="Total Revenue vs Total Cost")
     st.plotly_chart(fig, use_container_width=True)
     with st.expander("Download CSV"):
-        st.download_button("Download", revcost.to_csv(index=False), "revenue_vs_cost.csv", "text/csv")
+        st.download_button("Download", revcost_csv(*filters), "revenue_vs_cost.csv", "text/csv")
 
 # ─── Tab 5: Queue & Capacity ───────────────────────────────────────────────────
 with tabs[5]:
     st.header("Queue & Capacity Analysis (Novice View)")
-    medians = df.groupby("station_name").queue_length.median().sort_values(ascending=False)
-    top10_q = medians.head(10).index.tolist()
-    df["is_top10_q"] = df.station_name.isin(top10_q)
-    df["is_top10_i"] = df.station_name.isin(top10_q)
-    fig_q = px.box(
-        df, x="queue_length", y="station_name", orientation="h",
-        category_orders={"station_name": medians.index.tolist()},
-        color="is_top10_q", color_discrete_map={True:PRIMARY_RED, False:"#CCCCCC"},
-        labels={"queue_length":"Queue Length","station_name":"Station"},
-        title="Queue Length Distribution")
+    q = compute_box_quantiles(*filters)
+    order = q[("queue_length", 0.5)].sort_values(ascending=False).index.tolist()
+    top10_q = order[:10]
+    fig_q = summary_box(q, "queue_length", order, top10_q, {True:PRIMARY_RED, False:"#CCCCCC"})
+    fig_q.update_layout(title="Queue Length Distribution", xaxis_title="Queue Length", yaxis_title="Station")
     fig_q.add_vline(x=3, line_dash="dash", line_color="darkred", annotation_text=">3 queued", annotation_position="top right")
     st.plotly_chart(fig_q, use_container_width=True)
-    fig_i = px.box(
-        df, x="idle_time", y="station_name", orientation="h",
-        category_orders={"station_name": medians.index.tolist()},
-        color="is_top10_i", color_discrete_map={True:DARK_BG, False:"#EEEEEE"},
-        labels={"idle_time":"Idle Ports","station_name":"Station"},
-        title="Idle Ports Distribution")
+    fig_i = summary_box(q, "idle_time", order, top10_q, {True:DARK_BG, False:"#EEEEEE"})
+    fig_i.update_layout(title="Idle Ports Distribution", xaxis_title="Idle Ports", yaxis_title="Station")
     fig_i.add_vline(x=1, line_dash="dash", line_color="gray", annotation_text="<1 idle", annotation_position="top right")
     st.plotly_chart(fig_i, use_container_width=True)
-    df.drop(columns=["is_top10_q","is_top10_i"], inplace=True)
     with st.expander("Download CSV"):
-        st.download_button("Download", df[["station_name","queue_length","idle_time"]].to_csv(index=False), "queue_capacity.csv", "text/csv")
+        st.download_button("Download", queue_capacity_csv(*filters), "queue_capacity.csv", "text/csv")